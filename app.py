@@ -1,10 +1,405 @@
 import streamlit as st
-import pandas as pd
 from io import BytesIO
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
 from pathlib import Path
+import hashlib
+import importlib
+import importlib.util
 import re
+import threading
+import time
+
+inicio_script = time.perf_counter()  # Para medir cuánto tarda en aparecer el primer elemento
+
+
+class ModuloPerezoso:
+    """
+    Importa un módulo de forma diferida: se carga de verdad la primera vez que se usa.
+    No se registra en sys.modules, así nada lo carga por accidente al recorrer los módulos.
+    """
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.modulo = None
+
+    def __getattr__(self, atributo):
+        if self.modulo is None:
+            self.modulo = importlib.import_module(self.nombre)
+        return getattr(self.modulo, atributo)
+
+def importar_perezoso(nombre):
+    """Devuelve el módulo con carga diferida, o None si no está instalado."""
+    if importlib.util.find_spec(nombre) is None:
+        return None
+    return ModuloPerezoso(nombre)
+
+# pandas, numpy y polars solo se cargan cuando hay archivos que procesar
+pd = importar_perezoso("pandas")
+np = importar_perezoso("numpy")
+pl = importar_perezoso("polars")  # Motor columnar opcional (perezoso y multihilo)
+
+
+# -------------------------------------------------------------------------
+#                           Motor de transformación
+#  ------------------------------------------------------------------------
+
+# Si polars está instalado las reglas se ejecutan con él; si no, con pandas
+MOTOR = "polars" if pl is not None else "pandas"
+MOTORES = ["pandas", "polars"]
+
+def elegir_motor(motor=None):
+    """Devuelve el motor a usar (por defecto MOTOR) y falla si no existe o no está instalado."""
+    motor = motor or MOTOR
+    if motor not in MOTORES:
+        raise ValueError(f"Motor desconocido '{motor}'. Usa uno de: {', '.join(MOTORES)}")
+    if motor == "polars" and pl is None:
+        raise ValueError("El motor 'polars' no está disponible: instala polars (pip install polars)")
+    return motor
+
+# Opciones de lectura por tipo de archivo (las filas a omitir dependen del banco)
+formatos_lectura = {
+    ".txt": {"sep": ";", "decimal": ",", "encoding": "latin1"},
+    ".csv": {"sep": ",", "decimal": ".", "encoding": "latin1"},
+    ".xlsx": {},
+}
+
+def version_reglas(reglas):
+    """Huella de las reglas de un banco: si las reglas cambian, cambia la versión y el plan se recompila."""
+    return hashlib.sha1(repr(reglas).encode("utf-8")).hexdigest()[:12]
+
+# Operaciones cuyas columnas se leen como texto. Solo los códigos de transacción: leídos como número,
+# una celda vacía en la columna convierte '0304' en 304.0 y el código ya no se encuentra en codigos_dict.
+# El resto de columnas las interpreta pandas como siempre: una cuenta '0291252245' se lee 291252245 y
+# coincide con cuentas_bancos, las fechas de Excel llegan como fecha y los importes como número.
+operaciones_texto = {"numero"}
+
+def armar_plan(banco, version, reglas, operaciones, casos_especiales, esquema_salida):
+    """
+    Arma el plan de ejecución de un banco.
+    operaciones: {columna_salida: (operacion, [índices de origen])}, en el orden en que se ejecutan
+                 (una operación puede usar columnas de salida calculadas antes, p. ej. 'id' usa 'cuenta')
+    esquema_salida: columnas del resultado, en orden
+    """
+    for salida, (operacion, indices) in operaciones.items():
+        if operacion not in operaciones_pandas:
+            raise ValueError(f"Regla inválida para '{banco}': operación desconocida '{operacion}' en la columna '{salida}'")
+        for i in indices:
+            if not isinstance(i, int) or i < 0:
+                raise ValueError(f"Regla inválida para '{banco}': la columna '{salida}' usa el índice {i!r}")
+    faltantes = [c for c in esquema_salida if c not in operaciones]
+    if faltantes:
+        raise ValueError(f"Regla inválida para '{banco}': no hay operación para {', '.join(faltantes)}")
+
+    indices = sorted({i for _, origen in operaciones.values() for i in origen})
+    texto = {i for operacion, origen in operaciones.values() if operacion in operaciones_texto for i in origen}
+    otras = {i for operacion, origen in operaciones.values() if operacion not in operaciones_texto for i in origen}
+
+    return {
+        "banco": banco,
+        "version": version,
+        "columnas": reglas["columnas"],
+        "tipo_importe": reglas.get("tipo_importe", "abono_cargo"),
+        "indices": indices,
+        "num_columnas": indices[-1] + 1 if indices else 0,
+        "operaciones": operaciones,
+        "casos_especiales": casos_especiales,
+        "esquema_salida": esquema_salida,
+        "lectura": {
+            "usecols": indices,
+            "dtype": {i: str for i in sorted(texto - otras)},
+            "omitir_filas": reglas.get("omitir_filas", {}),
+        },
+    }
+
+def validar_plan(plan, num_columnas):
+    """Verifica que el archivo tenga todas las columnas que usa el plan."""
+    if num_columnas < plan["num_columnas"]:
+        raise ValueError(
+            f"El archivo tiene {num_columnas} columnas, pero las reglas de '{plan['banco']}' "
+            f"usan hasta la columna {plan['num_columnas'] - 1}"
+        )
+
+def contar_columnas(archivo, extension, opciones):
+    """
+    Número de columnas del archivo, sin leerlo completo.
+    - Excel: fila más larga de toda la hoja (la última columna puede venir vacía en las primeras filas)
+    - Texto: ancho de la primera línea, que es el que toma pandas para todo el archivo
+    """
+    if extension == ".xlsx":
+        from openpyxl import load_workbook
+
+        wb = load_workbook(archivo, read_only=True)
+        ws = wb.worksheets[0]
+        # Muchos programas escriben mal la dimensión de la hoja (p. ej. "A1"): se ignora, igual que en pandas
+        ws.reset_dimensions()
+        num_columnas = max((len(fila) for fila in ws.iter_rows(values_only=True)), default=0)
+        wb.close()
+    else:
+        num_columnas = pd.read_csv(archivo, nrows=1, **opciones).shape[1]
+    archivo.seek(0)
+    return num_columnas
+
+def leer_extracto(archivo, plan):
+    """
+    Lee un extracto según el plan: primero valida el número de columnas del archivo
+    y después lee solo las columnas que usan las reglas, con su tipo de dato.
+    """
+    extension = Path(archivo.name).suffix.lower()
+    opciones = dict(formatos_lectura[extension], header=None, skiprows=plan["lectura"]["omitir_filas"].get(extension, 0))
+    leer = pd.read_excel if extension == ".xlsx" else pd.read_csv
+
+    validar_plan(plan, contar_columnas(archivo, extension, opciones))
+
+    df = leer(archivo, usecols=plan["lectura"]["usecols"], dtype=plan["lectura"]["dtype"], **opciones)
+    # Devolver las columnas a su posición original para que los índices de las reglas sigan valiendo
+    return df.reindex(columns=range(plan["num_columnas"]))
+
+def exportar_excel(df):
+    """Genera el Excel consolidado con formato contable. openpyxl se importa solo al exportar."""
+    from openpyxl import load_workbook
+
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False, engine='openpyxl')
+    buffer.seek(0)
+
+    # Aplicar formato con openpyxl
+    wb = load_workbook(buffer)
+    ws = wb.active
+
+    if "importe" in df.columns:
+        col_importe = df.columns.get_loc('importe') + 1
+        for row in ws.iter_rows(min_row=2, min_col=col_importe, max_col=col_importe):
+            for cell in row:
+                cell.number_format = '#,##0.00;[Red]-#,##0.00' # miles con "." y decimales con "," y negativos en rojo
+
+    # Guardar en nuevo buffer
+    buffer_final = BytesIO()
+    wb.save(buffer_final)
+    return buffer_final.getvalue()
+
+def a_texto(datos):
+    """
+    Convierte a texto como .astype(str) en pandas 2: las celdas vacías quedan como 'nan'.
+    (En pandas 3 .astype(str) deja los vacíos como NaN; así ambos motores dan lo mismo.)
+    """
+    return datos.astype(str).fillna("nan")
+
+def df_a_polars(df, indices):
+    """
+    Pasa a polars solo las columnas que usan las reglas (con nombres c0, c1, ...).
+    Las columnas con tipos mezclados o de fecha (p. ej. leídas de Excel) se pasan antes
+    a texto en pandas, para que su texto sea el mismo que da .astype(str).
+    """
+    entrada = []
+    for i in indices:
+        serie = df.iloc[:, i]
+        numerica = pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie)
+        if not numerica and pd.api.types.infer_dtype(serie, skipna=True) not in ("string", "empty"):
+            serie = serie.astype(str).where(serie.notna())
+        entrada.append(pl.from_pandas(serie).alias(f"c{i}"))
+    return pl.DataFrame(entrada).lazy()
+
+def texto_polars(indice):
+    """Columna de entrada como texto, igual que a_texto en el motor pandas."""
+    return pl.col(f"c{indice}").cast(pl.String).fill_null("nan")
+
+def numero_polars(valor):
+    """
+    Convierte a número como pd.to_numeric(errors="coerce").fillna(0): lo que no es número queda en 0.
+    Como en pandas, un texto con espacios alrededor se lee como número (' 5 ' -> 5), salvo inf y nan.
+    """
+    sin_espacios = valor.cast(pl.String).str.strip_chars(" \t\n\r\x0b\x0c").cast(pl.Float64, strict=False)
+    numero = pl.coalesce([valor.cast(pl.Float64, strict=False), pl.when(sin_espacios.is_finite()).then(sin_espacios)])
+    return numero.fill_nan(0).fill_null(0)
+
+# Campos de fecha con la misma expresión regular que usa pandas (la de time.strptime). polars acepta
+# cualquier cantidad de dígitos en %Y ('1/8/25' -> año 25) y separa distinto las fechas sin separador.
+campos_fecha = {
+    "%d": r"(?P<d>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])",
+    "%m": r"(?P<m>1[0-2]|0[1-9]|[1-9])",
+    "%y": r"(?P<y>\d\d)",
+    "%Y": r"(?P<Y>\d\d\d\d)",
+}
+
+def fecha_polars(texto, formato):
+    """
+    Lee fechas en un formato igual que pd.to_datetime(format=...): separa los campos con la misma
+    expresión regular, exige que no sobre texto y arma la fecha AAAA-MM-DD (lo que no cumple queda nulo).
+    """
+    patron = "^(?P<todo>" + re.sub(r"%[dmyY]", lambda campo: campos_fecha[campo.group()], re.escape(formato)) + ")"
+    partes = texto.str.extract_groups(patron)
+    if "%Y" in formato:
+        anio = partes.struct.field("Y")
+    else:
+        anio = partes.struct.field("y").cast(pl.Int32)
+        anio = pl.when(anio < 69).then(anio + 2000).otherwise(anio + 1900).cast(pl.String)  # como %y en Python
+    mes = partes.struct.field("m").str.zfill(2)
+    dia = partes.struct.field("d").str.strip_chars().str.zfill(2)
+    fecha = pl.concat_str([anio, mes, dia], separator="-").str.strptime(pl.Date, "%Y-%m-%d", strict=False)
+    completa = partes.struct.field("todo").str.len_chars() == texto.str.len_chars()
+    return pl.when(completa).then(fecha)
+
+def polars_a_df(resultado, index):
+    """Convierte el resultado de polars a pandas con los mismos tipos que el motor pandas."""
+    df = resultado.to_pandas()
+    texto = [nombre for nombre, tipo in resultado.schema.items() if tipo == pl.String]
+    if texto:
+        # Texto con el tipo de pandas (object o str) y vacíos como NaN, igual que .dt.strftime
+        df[texto] = df[texto].astype(object).where(df[texto].notna(), np.nan).astype(pd.Series(dtype=str).dtype)
+    df.index = index
+    df.columns = pd.Index(df.columns, dtype=object)
+    return df
+
+# Operaciones por columna de salida. Cada motor tiene un manejador por operación:
+#   pandas: f(df, origen, salida, plan, archivo) -> Serie o valor fijo
+#   polars: f(origen, salida, plan, archivo)     -> expresión
+# 'origen' son los índices de columna del archivo y 'salida' las columnas ya calculadas.
+
+def nombre_archivo(archivo):
+    """Número de cuenta tomado del nombre del archivo (sin extensión ni caracteres raros)."""
+    if archivo is None:
+        return ""  # Si por alguna razón no tiene nombre_archivo, deja vacío
+    return re.sub(r'[^A-Za-z0-9_\-]', '', Path(archivo.name).stem)
+
+def fechas_pandas(df, origen, parsear):
+    return df.iloc[:, origen[0]].pipe(a_texto).str.strip().apply(parsear).dt.strftime("%d/%m/%Y")
+
+def importe_pandas(df, origen, salida, plan, archivo):
+    importe = pd.to_numeric(df.iloc[:, origen[0]], errors="coerce").fillna(0).astype(float)
+    # Davivienda: según referencia (CREDITO -> positivo) (DEBITO -> negativo)
+    signo = plan['casos_especiales'].get('signo_por_referencia')
+    if signo:
+        referencia_signo = pd.Series(salida['referencia'], index=df.index).fillna("").astype(str).str.upper()
+        importe[referencia_signo.str.contains(signo)] *= -1
+    return importe
+
+def formato_cuenta_pandas(df, origen, salida, plan, archivo):
+    # Formato especial según banco (Banorte: prefijo + últimos dígitos, Edenred: valor fijo)
+    cuenta = df.iloc[:, origen[0]].pipe(a_texto).str.strip()
+    formato_cuenta = plan['casos_especiales']['formato_cuenta']
+    if 'fija' in formato_cuenta:
+        return formato_cuenta['fija']
+    if 'prefijo' in formato_cuenta:
+        return formato_cuenta['prefijo'] + cuenta.str[-formato_cuenta['ultimos_digitos']:]
+    return cuenta
+
+def nit_pandas(df, origen, salida, plan, archivo):
+    return (
+        df.iloc[:, origen[0]].pipe(a_texto)     # aseguramos string
+        .str.upper()                            # estandarizamos mayúsculas
+        .str.replace(r"[A-Z]", "", regex=True)  # quitamos cualquier letra
+        .str.strip()                            # quitamos espacios en blanco
+        .str.lstrip('0')                        # quitamos ceros a la izquierda
+        .apply(limpiar_nit)                     # aplicamos la regla de los 10 dígitos
+    )
+
+operaciones_pandas = {
+    'vacia': lambda df, origen, salida, plan, archivo: "",
+    'texto': lambda df, origen, salida, plan, archivo: df.iloc[:, origen[0]].pipe(a_texto),
+    'concatenar': lambda df, origen, salida, plan, archivo: (
+        df.iloc[:, origen]      # seleccionamos varias columnas (ej. [1,2,3])
+        .pipe(a_texto)          # convertimos a texto
+        .apply(lambda fila: ' '.join(fila).strip(), axis=1)  # concatenamos y eliminamos espacios al inicio y al final
+    ),
+    'referencia': lambda df, origen, salida, plan, archivo: df.iloc[:, origen[0]].pipe(a_texto).str.lstrip('0').str.upper(),
+    'sin_ceros': lambda df, origen, salida, plan, archivo: df.iloc[:, origen[0]].pipe(a_texto).str.lstrip('0'),
+    'numero': lambda df, origen, salida, plan, archivo: df.iloc[:, origen[0]].pipe(a_texto).str.lstrip('0'),
+    'nit': nit_pandas,
+    'fecha': lambda df, origen, salida, plan, archivo: fechas_pandas(df, origen, parsear_fecha_multiple),
+    'fecha_hora': lambda df, origen, salida, plan, archivo: fechas_pandas(df, origen, parsear_fecha_multiple_mx),
+    'dia': lambda df, origen, salida, plan, archivo: pd.to_datetime(salida['fecha_ope'], format="%d/%m/%Y", errors="coerce").dt.day,
+    # Si no existe la columna, busca el código en el diccionario, si no existe muestra 'Desconocido'
+    'codigo': lambda df, origen, salida, plan, archivo: salida['numero'].astype(str).map(codigos_dict).fillna('Desconocido'),
+    'importe': importe_pandas,
+    'abono_cargo': lambda df, origen, salida, plan, archivo: calcular_importe(df, origen, plan),
+    'formato_cuenta': formato_cuenta_pandas,
+    'nombre_archivo': lambda df, origen, salida, plan, archivo: nombre_archivo(archivo),
+    # mapear id por cuenta (si la cuenta está en el diccionario)
+    'id_cuenta': lambda df, origen, salida, plan, archivo: (
+        pd.Series(salida['cuenta'], index=df.index).astype(str).map(cuentas_bancos).fillna('Desconocido')
+    ),
+}
+
+def ejecutar_plan_pandas(df, plan, archivo=None):
+    """Ejecuta las operaciones del plan con pandas, en orden, y devuelve las columnas del esquema de salida."""
+    salida = {}
+    for nombre, (operacion, origen) in plan['operaciones'].items():
+        valor = operaciones_pandas[operacion](df, origen, salida, plan, archivo)
+        salida[nombre] = valor if isinstance(valor, pd.Series) else pd.Series(valor, index=df.index)
+    df_final = pd.DataFrame({nombre: salida[nombre] for nombre in plan['esquema_salida']}, index=df.index)
+    df_final.columns = pd.Index(df_final.columns, dtype=object)
+    return df_final
+
+def importe_polars(origen, salida, plan, archivo):
+    importe = numero_polars(pl.col(f"c{origen[0]}"))
+    # Davivienda: según referencia (CREDITO -> positivo) (DEBITO -> negativo)
+    signo = plan['casos_especiales'].get('signo_por_referencia')
+    if signo:
+        debito = salida['referencia'].str.to_uppercase().str.contains(signo, literal=True)
+        importe = pl.when(debito).then(-importe).otherwise(importe)
+    return importe
+
+def formato_cuenta_polars(origen, salida, plan, archivo):
+    cuenta = texto_polars(origen[0]).str.strip_chars()
+    formato_cuenta = plan['casos_especiales']['formato_cuenta']
+    if 'fija' in formato_cuenta:
+        return pl.lit(formato_cuenta['fija'])
+    if 'prefijo' in formato_cuenta:
+        return pl.lit(formato_cuenta['prefijo']) + cuenta.str.slice(-formato_cuenta['ultimos_digitos'])
+    return cuenta
+
+def nit_polars(origen, salida, plan, archivo):
+    return limpiar_nit_polars(
+        texto_polars(origen[0])
+        .str.to_uppercase()
+        .str.replace_all(r"[A-Z]", "")
+        .str.strip_chars()
+        .str.strip_chars_start('0')
+    )
+
+operaciones_polars = {
+    'vacia': lambda origen, salida, plan, archivo: pl.lit(""),
+    'texto': lambda origen, salida, plan, archivo: texto_polars(origen[0]),
+    'concatenar': lambda origen, salida, plan, archivo: (
+        pl.concat_str([texto_polars(i) for i in origen], separator=" ").str.strip_chars()
+    ),
+    'referencia': lambda origen, salida, plan, archivo: texto_polars(origen[0]).str.strip_chars_start('0').str.to_uppercase(),
+    'sin_ceros': lambda origen, salida, plan, archivo: texto_polars(origen[0]).str.strip_chars_start('0'),
+    'numero': lambda origen, salida, plan, archivo: texto_polars(origen[0]).str.strip_chars_start('0'),
+    'nit': nit_polars,
+    'fecha': lambda origen, salida, plan, archivo: (
+        parsear_fecha_multiple_polars(texto_polars(origen[0])).dt.strftime("%d/%m/%Y")
+    ),
+    'fecha_hora': lambda origen, salida, plan, archivo: (
+        parsear_fecha_multiple_mx_polars(texto_polars(origen[0])).dt.strftime("%d/%m/%Y")
+    ),
+    'dia': lambda origen, salida, plan, archivo: (
+        salida['fecha_ope'].str.strptime(pl.Date, "%d/%m/%Y", strict=False).dt.day().cast(pl.Int32)
+    ),
+    'codigo': lambda origen, salida, plan, archivo: (
+        salida['numero'].replace_strict(codigos_dict, default="Desconocido", return_dtype=pl.String)
+    ),
+    'importe': importe_polars,
+    'abono_cargo': lambda origen, salida, plan, archivo: calcular_importe_polars(origen, plan),
+    'formato_cuenta': formato_cuenta_polars,
+    'nombre_archivo': lambda origen, salida, plan, archivo: pl.lit(nombre_archivo(archivo)),
+    # El id queda nulo si la cuenta no está en el diccionario; se completa con 'Desconocido' en pandas
+    'id_cuenta': lambda origen, salida, plan, archivo: (
+        salida['cuenta'].replace_strict(cuentas_bancos, default=None, return_dtype=pl.Int64)
+    ),
+}
+
+def ejecutar_plan_polars(df, plan, archivo=None):
+    """Igual que ejecutar_plan_pandas, pero arma una expresión por columna y las evalúa juntas con polars."""
+    salida = {}
+    for nombre, (operacion, origen) in plan['operaciones'].items():
+        salida[nombre] = operaciones_polars[operacion](origen, salida, plan, archivo)
+    expresiones = [salida[nombre].alias(nombre) for nombre in plan['esquema_salida']]
+
+    resultado = df_a_polars(df, plan['indices']).select(expresiones).collect()
+    df_final = polars_a_df(resultado, df.index)
+    for nombre in plan['esquema_salida']:
+        if plan['operaciones'][nombre][0] == 'id_cuenta':
+            df_final[nombre] = df_final[nombre].fillna('Desconocido')
+    return df_final
 
 
 # -------------------------------------------------------------------------
@@ -25,7 +420,8 @@ reglas_bancos_mx = {
         },
         "tipo_importe": "abono_cargo" ,
         "separador_miles": ".",
-        "separador_decimales": ","
+        "separador_decimales": ",",
+        "omitir_filas": {".csv": 1, ".xlsx": 2}
     },
 
         "Banorte": {
@@ -38,6 +434,9 @@ reglas_bancos_mx = {
             "abono": 7,    
         },
         "tipo_importe": "" ,
+        "limpiar_importe": True,                                        # quitar $ y comas de miles
+        "formato_cuenta": {"prefijo": "BANORTE ", "ultimos_digitos": 4},
+        "omitir_filas": {".csv": 1, ".xlsx": 1}
     },
 
         "Edenred": {
@@ -51,6 +450,9 @@ reglas_bancos_mx = {
             "ref 1": 3,
         },
         "tipo_importe": "" ,
+        "limpiar_importe": True,
+        "formato_cuenta": {"fija": "EDENRED"},
+        "omitir_filas": {".csv": 1, ".xlsx": 1}
     }
 }
 
@@ -83,26 +485,67 @@ def parsear_fecha_multiple_mx(valor):
             continue
     return pd.NaT
 
+def parsear_fecha_multiple_mx_polars(texto):
+    """Versión vectorizada de parsear_fecha_multiple_mx: el primer formato que funcione gana."""
+    texto = texto.str.strip_chars().str.split(" ").list.first()  # quitar la hora si viene
+    return pl.coalesce([fecha_polars(texto, formato) for formato in formatos_fecha_mx])
+
+
+# 3. Plan de ejecución por banco (se compila una vez por versión de las reglas)
+
+@st.cache_resource(show_spinner=False)
+def compilar_plan_mx(banco, version):
+    """Compila las reglas de un banco de México; 'version' forma parte de la llave de la caché."""
+    if banco not in reglas_bancos_mx:
+        raise ValueError(f"No hay reglas definidas para el banco '{banco}'")
+
+    reglas = reglas_bancos_mx.get(banco)
+    columnas = reglas['columnas']
+
+    faltantes = [c for c in ['cuenta', 'fecha', 'fecha_ope', 'concepto', 'cargo', 'abono'] if c not in columnas]
+    if faltantes:
+        raise ValueError(f"Las reglas de '{banco}' no definen las columnas: {', '.join(faltantes)}")
+
+    concepto = columnas['concepto']
+    operaciones = {
+        'fecha_ope': ('fecha_hora', [columnas['fecha_ope']]),
+        'fecha': ('fecha_hora', [columnas['fecha']]),
+        'ref 1': ('referencia', [columnas['ref 1']]) if 'ref 1' in columnas else ('vacia', []),
+        'ref 2': ('referencia', [columnas['ref 2']]) if 'ref 2' in columnas else ('vacia', []),
+        'concepto': ('concatenar', concepto) if isinstance(concepto, list) else ('texto', [concepto]),
+        'importe': ('abono_cargo', [columnas['abono'], columnas['cargo']]),
+        'cuenta': ('formato_cuenta', [columnas['cuenta']]),
+    }
+    casos_especiales = {
+        "limpiar_importe": reglas.get("limpiar_importe", False),
+        "formato_cuenta": reglas.get("formato_cuenta") or {},
+    }
+    esquema_salida = ['cuenta','fecha', 'fecha_ope', 'concepto', 'importe', 'ref 1', 'ref 2']
+    return armar_plan(banco, version, reglas, operaciones, casos_especiales, esquema_salida)
+
+def obtener_plan_mx(banco):
+    """Devuelve el plan (en caché) para la versión actual de las reglas del banco."""
+    return compilar_plan_mx(banco, version_reglas(reglas_bancos_mx.get(banco)))
+
 
 # 4. Función calcular importe
 
 
-def calcular_importe(df, reglas, banco=None):
+def calcular_importe(df, origen, plan):
     """
-    Calcula el importe según las reglas del banco.
-    - reglas["columnas"]["abono"]: índice de columna de abonos
-    - reglas["columnas"]["cargo"]: índice de columna de cargos
-    - reglas.get("tipo_importe"): 'abono_cargo' o 'cargo_abono'
+    Calcula el importe según el plan del banco.
+    - origen: [índice de columna de abonos, índice de columna de cargos]
+    - plan["tipo_importe"]: 'abono_cargo' o 'cargo_abono'
+    - plan["casos_especiales"]["limpiar_importe"]: quitar símbolos y comas antes de convertir
     """
 
-    columnas = reglas['columnas']
-    tipo = reglas.get("tipo_importe", "abono_cargo")
+    tipo = plan['tipo_importe']
 
     # Extraer columnas
-    abono_col = df.iloc[:, columnas['abono']].astype(str).str.strip()
-    cargo_col = df.iloc[:, columnas['cargo']].astype(str).str.strip()
+    abono_col = df.iloc[:, origen[0]].pipe(a_texto).str.strip()
+    cargo_col = df.iloc[:, origen[1]].pipe(a_texto).str.strip()
 
-    # 🚨 Limpieza especial solo para Banorte
+    # 🚨 Limpieza especial (Banorte, Edenred)
     
     def limpiar_columna(serie):
         return (
@@ -111,187 +554,116 @@ def calcular_importe(df, reglas, banco=None):
             .str.replace(',', '', regex=False)          # elimina comas de miles
             .replace('', '0')                           # si queda vacío → 0
         )
-    if banco in ["Banorte", "Edenred"]:
+    if plan['casos_especiales']['limpiar_importe']:
         abono_col = limpiar_columna(abono_col)
         cargo_col = limpiar_columna(cargo_col) 
     
        # Convertir a numérico
-    abono = pd.to_numeric(abono_col, errors="coerce").fillna(0)
-    cargo = pd.to_numeric(cargo_col, errors="coerce").fillna(0)
+    abono = pd.to_numeric(abono_col, errors="coerce").fillna(0).astype(float)
+    cargo = pd.to_numeric(cargo_col, errors="coerce").fillna(0).astype(float)
 
     # Retornar según el tipo de cálculo
     return abono - cargo if tipo == "abono_cargo" else -cargo + abono
 
-# 5. Función genérica de transformación para bancos de México
-
-def transformar_extracto_mx(df,banco, archivo=None):
-    
-    if banco not in reglas_bancos_mx:
-        raise ValueError(f"No hay reglas definidas para el banco '{banco}'")
-
-    reglas = reglas_bancos_mx.get(banco)
-    columnas = reglas['columnas']
-    
-    df_out_mx = df.copy()
-
-    # Mapear columnas según reglas
-
-    # ✅ Columnas: fechas
-    df_out_mx['fecha_ope'] = (
-        df.iloc[:, columnas['fecha_ope']]
-        .astype(str)
-        .str.strip()
-        .apply(parsear_fecha_multiple_mx)
-    )
-    df_out_mx['fecha_ope'] = df_out_mx['fecha_ope'].dt.strftime("%d/%m/%Y")
-
-    df_out_mx['fecha'] = (
-        df.iloc[:, columnas['fecha']]
-        .astype(str)
-        .str.strip()
-        .apply (parsear_fecha_multiple_mx)
-    )
-    df_out_mx['fecha'] = df_out_mx['fecha'].dt.strftime("%d/%m/%Y")
-
- # ✅ Columnas opcionales
-    opcionales_mx = {
-        'ref 1': lambda s: s.astype(str).str.lstrip('0').str.upper(),
-        'ref 2': lambda s: s.astype(str).str.lstrip('0').str.upper()
-    }
-
-    for col, func in opcionales_mx.items():
-        if col in columnas:
-            df_out_mx[col] = func(df.iloc[:, columnas[col]])
-        else:
-            df_out_mx[col] = ""
-
-# ✅ Columna: concepto
-   
-   # Concatenar varias columnas si es necesario o tomar información de una sola
-    concepto_cols = columnas['concepto']
-    if isinstance(concepto_cols, list):
-        # concatenar columnas en orden   
-        df_out_mx['concepto'] =(
-            df.iloc[:, concepto_cols] # seleccionamos varias columnas (ej. [1,2,3])
-            .astype(str)              # convertimos a texto
-            .apply(lambda fila: ' '.join(fila).strip(), axis=1) # concatenamos y eliminamos espacios en blanco al inicio y al final
+def calcular_importe_polars(origen, plan):
+    """Versión polars de calcular_importe."""
+    abono, cargo = [texto_polars(i).str.strip_chars() for i in origen]
+    if plan['casos_especiales']['limpiar_importe']:
+        abono, cargo = [
+            pl.when(limpio == "").then(pl.lit("0")).otherwise(limpio)
+            for limpio in (
+                valor.str.replace_all(r'[^0-9,.-]', '').str.replace_all(',', '', literal=True)
+                for valor in (abono, cargo)
             )
-    else:
-        # una sola columna
-        df_out_mx["concepto"] = df.iloc[:, concepto_cols].astype(str)
-
-# ✅ Columna: importe
+        ]
+    abono, cargo = numero_polars(abono), numero_polars(cargo)
+    return abono - cargo if plan['tipo_importe'] == "abono_cargo" else -cargo + abono
 
-    df_out_mx['importe'] = calcular_importe(df, reglas,banco=banco)
+# 5. Función de transformación: ejecuta el plan con el motor disponible (polars o pandas)
 
-# ✅ Columna: cuenta
-
-    df_out_mx['cuenta'] = df.iloc[:, columnas['cuenta']].astype(str).str.strip()
-    
-    # Formato especial según banco
+def transformar_extracto_mx(df, banco, archivo=None, motor=None):
+    motor = elegir_motor(motor)
+    plan = obtener_plan_mx(banco)
+    validar_plan(plan, df.shape[1])
 
-    if banco == "Banorte":
-        df_out_mx['cuenta'] = "BANORTE " + df_out_mx['cuenta'].str[-4:]
-    elif banco == "Edenred":
-        df_out_mx['cuenta'] = "EDENRED"
-                                                               
-    df_final_mx = df_out_mx[['cuenta','fecha', 'fecha_ope', 'concepto', 'importe', 'ref 1', 'ref 2']]
-    return df_final_mx
+    if motor == "polars":
+        return ejecutar_plan_polars(df, plan, archivo=archivo)
+    return ejecutar_plan_pandas(df, plan, archivo=archivo)
 
 
 # -------------------------- Interfaz Streamlit --------------------------
-st.title("Transformador de Extractos")
 
-st.subheader("🏦 Bancos de México")
+def seccion_mx(procesar=True):
+    """
+    Sección de México. Los widgets se dibujan siempre, para que el banco y los archivos
+    se conserven al cambiar de pestaña; los archivos solo se procesan si procesar=True.
+    """
 
-# Seleccionar banco
-banco_seleccionado_mx = st.selectbox(
-    "Selecciona el banco",
-    options=list(reglas_bancos_mx.keys())
-)
+    # Seleccionar banco
+    banco_seleccionado_mx = st.selectbox(
+        "Selecciona el banco",
+        options=list(reglas_bancos_mx.keys()),
+        key="banco_mx"
+    )
 
-# Subir archivo
-archivos_mx = st.file_uploader(
-    "📂 Carga tus extractos",
-    type=["txt","csv", "xlsx"],
-    accept_multiple_files=True,
-    key="uploader_mx")
+    # Subir archivo
+    archivos_mx = st.file_uploader(
+        "📂 Carga tus extractos",
+        type=["txt","csv", "xlsx"],
+        accept_multiple_files=True,
+        key="uploader_mx")
 
-# Lista para guardar los resultados de cada archivo transformado
+    if not procesar:
+        return
 
-dfs_transformados_mx = []
-archivos_cargados_mx = []
+    # Lista para guardar los resultados de cada archivo transformado
 
-if archivos_mx is not None: # Verifica si hay archivos cargados
-    for archivo in archivos_mx:
-        try:
+    dfs_transformados_mx = []
+    archivos_cargados_mx = []
 
-            nombre = archivo.name.lower()
-
-            # Detectar tipo de archivo por extensión
-            if nombre.endswith(".txt"):
-                df = pd.read_csv(archivo, sep=';', decimal=",", encoding='latin1', header=None)
-            elif nombre.endswith(".csv"):
-                df = pd.read_csv(archivo, sep=",", decimal=".", encoding="latin1", header=None, skiprows=1)
-            elif nombre.endswith(".xlsx"):
-                    if banco_seleccionado_mx == "BBVA":
-                        df = pd.read_excel(archivo, header=None, skiprows=2)  # Omitir 2 primeras filas
-                    else:
-                        df = pd.read_excel(archivo, header=None, skiprows=1)
-            else:
-                st.warning(f"Formato no compatible: {archivo.name}")
-                continue    
-
-            # Transformar archivo
-            df_transformado_mx = transformar_extracto_mx(df, banco=banco_seleccionado_mx, archivo=archivo)
-            dfs_transformados_mx.append(df_transformado_mx)
-            archivos_cargados_mx.append(f"✅ {archivo.name}")
-
-        except Exception as e: 
-            archivos_cargados_mx.append(f"❌ {archivo.name} (Error: {e})")     
-    
-    # Mostrar resumen en un expander
-    with st.expander("Ver archivos cargados y estado"):
-        for estado in archivos_cargados_mx:
-            st.write(estado)
+    if archivos_mx is not None: # Verifica si hay archivos cargados
+        for archivo in archivos_mx:
+            try:
 
-    if dfs_transformados_mx:
-        df_transformado_mx = pd.concat(dfs_transformados_mx, ignore_index=True)
+                # Detectar tipo de archivo por extensión
+                if Path(archivo.name).suffix.lower() not in formatos_lectura:
+                    st.warning(f"Formato no compatible: {archivo.name}")
+                    continue    
 
-        st.success("✅ Archivos procesados y consolidados correctamente") 
+                # Leer solo las columnas del plan (valida el número de columnas antes de la lectura completa)
+                df = leer_extracto(archivo, obtener_plan_mx(banco_seleccionado_mx))
 
-        # Mostrar vista previa del consolidado
-        st.subheader(f"Vista previa:")
-        st.dataframe(df_transformado_mx.head(5))        
+                # Transformar archivo
+                df_transformado_mx = transformar_extracto_mx(df, banco=banco_seleccionado_mx, archivo=archivo)
+                dfs_transformados_mx.append(df_transformado_mx)
+                archivos_cargados_mx.append(f"✅ {archivo.name}")
 
+            except Exception as e: 
+                archivos_cargados_mx.append(f"❌ {archivo.name} (Error: {e})")     
+    
+        # Mostrar resumen en un expander
+        with st.expander("Ver archivos cargados y estado"):
+            for estado in archivos_cargados_mx:
+                st.write(estado)
 
-        # Descargar archivo en Excel
-        buffer = BytesIO()
-        df_transformado_mx.to_excel(buffer, index=False, engine='openpyxl')
-        buffer.seek(0)
+        if dfs_transformados_mx:
+            df_transformado_mx = pd.concat(dfs_transformados_mx, ignore_index=True)
 
-        # Aplicar formato con openpyxl
-        wb = load_workbook(buffer)
-        ws = wb.active
+            st.success("✅ Archivos procesados y consolidados correctamente") 
 
-        if "importe" in df_transformado_mx.columns:
-            # Ubicar la columna "importe" (posición 12 en df_final)
-            col_importe = df_transformado_mx.columns.get_loc('importe') + 1
-            for row in ws.iter_rows(min_row=2, min_col=col_importe, max_col=col_importe):
-                for cell in row:
-                    cell.number_format = '#,##0.00;[Red]-#,##0.00' # miles con "." y decimales con "," y negativos en rojo        
+            # Mostrar vista previa del consolidado
+            st.subheader(f"Vista previa:")
+            st.dataframe(df_transformado_mx.head(5))        
 
-            # Guardar en nuevo buffer
-            buffer_final_mx = BytesIO()
-            wb.save(buffer_final_mx)
-            buffer_final_mx.seek(0)
 
+            # Descargar archivo en Excel (se genera al hacer clic)
             st.download_button(
                 label="📥 Descargar extractos consolidados",
-                data=buffer_final_mx,
+                data=lambda: exportar_excel(df_transformado_mx),
                 file_name=f"{banco_seleccionado_mx} - extractos_transformados.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )  
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                on_click="ignore"
+            )
 
 
 # -----------------------------------------------------------------------
@@ -442,7 +814,10 @@ reglas_bancos = {
         },
         "separador_miles": ",",
         "separador_decimales": ".",
-        "id": cuentas_bancos
+        "id": cuentas_bancos,
+        "cuenta_desde_archivo": True,           # la cuenta es el nombre del archivo
+        "signo_por_referencia": "DEBITO",       # importe negativo si la referencia lo contiene
+        "omitir_filas": {".xlsx": 3}
     } 
 }
 
@@ -458,6 +833,11 @@ def limpiar_nit(valor):
             return valor[:-1]             # quitamos el último dígito
     return valor                          # si no cumple, lo dejamos igual
 
+def limpiar_nit_polars(nit):
+    """Versión vectorizada de limpiar_nit (regla de los 10 dígitos)."""
+    regla = nit.str.contains(r"^\d{10}$") & nit.str.slice(0, 3).cast(pl.Int64, strict=False).is_between(800, 999)
+    return pl.when(regla).then(nit.str.slice(0, 9)).otherwise(nit)
+
 
 # 3. Función para parsear múltiples formatos de fecha
 
@@ -482,219 +862,186 @@ def parsear_fecha_multiple(valor):
             continue
     return pd.NaT
 
-# 4. Función genérica de transformación para bancos de Colombia
+def parsear_fecha_multiple_polars(texto):
+    """Versión vectorizada de parsear_fecha_multiple: el primer formato que funcione gana."""
+    texto = texto.str.strip_chars()
+    return pl.coalesce([fecha_polars(texto, formato) for formato in formatos_fecha])
 
-def transformar_extracto(df,banco, archivo=None):
-    """"
-    df: DataFrame leido del archivo
-    banco: nombre del banco en reglas_bancos
-    archivo: objeto uploaded file de Streamlit (para extraer nombre)
-    """
+# 4. Plan de ejecución por banco (se compila una vez por versión de las reglas)
 
+@st.cache_resource(show_spinner=False)
+def compilar_plan(banco, version):
+    """Compila las reglas de un banco de Colombia; 'version' forma parte de la llave de la caché."""
     if banco not in reglas_bancos:
         raise ValueError(f"No hay reglas definidas para el banco '{banco}'")
 
     reglas = reglas_bancos.get(banco)
     columnas = reglas['columnas']
 
-    df_out = df.copy()
-    
-    # Mapear columnas según reglas
-
-        # ✅ Columna: número
-    df_out['numero'] = df.iloc[:, columnas ['numero']].astype(str).str.lstrip('0')
-
-        
-        # ✅ Columna: tipo_transaccion
-    if 'tipo_transaccion' in columnas:
-            # Si existe la columna, solo muestra el valor tal cual (como texto)
-        df_out['tipo_transaccion'] = df.iloc[:, columnas ['tipo_transaccion']].astype(str)
-    else: 
-            # Si no existe la columna, busca el código en el diccionario, si no existe muestra 'Desconocido'
-        df_out['tipo_transaccion'] = df_out['numero'].astype(str).map(codigos_dict).fillna('Desconocido')
-
-        
-        # ✅ Columnas: fechas
-    df_out['fecha_ope'] = (
-        df.iloc[:, columnas['fecha_ope']]
-        .astype(str)
-        .str.strip()
-        .apply(parsear_fecha_multiple)
-    )
-    df_out['fecha_ope'] = df_out['fecha_ope'].dt.strftime("%d/%m/%Y")
+    faltantes = [c for c in ['fecha_ope', 'fecha', 'numero', 'importe'] if c not in columnas]
+    if faltantes:
+        raise ValueError(f"Las reglas de '{banco}' no definen las columnas: {', '.join(faltantes)}")
 
-    df_out['fecha'] = (
-        df.iloc[:, columnas['fecha']]
-        .astype(str)
-        .str.strip()
-        .apply (parsear_fecha_multiple)
-    )
-    df_out['fecha'] = df_out['fecha'].dt.strftime("%d/%m/%Y")
+    def opcional(nombre, operacion):
+        return (operacion, [columnas[nombre]]) if nombre in columnas else ('vacia', [])
+
+    if reglas.get("cuenta_desde_archivo"):
+        cuenta = ('nombre_archivo', [])
+    else:
+        cuenta = opcional('cuenta', 'texto')
+
+    operaciones = {
+        'numero': ('numero', [columnas['numero']]),
+        'tipo_transaccion': ('texto', [columnas['tipo_transaccion']]) if 'tipo_transaccion' in columnas else ('codigo', []),
+        'fecha_ope': ('fecha', [columnas['fecha_ope']]),
+        'fecha': ('fecha', [columnas['fecha']]),
+        'día': ('dia', []),
+        'it': opcional('it', 'texto'),
+        'nit': opcional('nit', 'nit'),
+        'nid': opcional('nid', 'sin_ceros'),
+        'referencia': opcional('referencia', 'referencia'),
+        'importe': ('importe', [columnas['importe']]),
+        'i': ('vacia', []),
+        'descripcion': ('vacia', []),
+        'provisional': ('vacia', []),
+        'cuenta': cuenta,
+        'id': ('id_cuenta', []),
+    }
+    casos_especiales = {
+        "cuenta_desde_archivo": reglas.get("cuenta_desde_archivo", False),
+        "signo_por_referencia": reglas.get("signo_por_referencia"),
+    }
+    esquema_salida = ['id', 'cuenta', 'fecha_ope', 'fecha', 'día', 'numero', 'tipo_transaccion', 'i', 'descripcion', 'it', 'provisional', 'importe','nit','nid', 'referencia']
+    return armar_plan(banco, version, reglas, operaciones, casos_especiales, esquema_salida)
 
-    df_out['día'] = pd.to_datetime(df_out['fecha_ope'], format="%d/%m/%Y", errors="coerce").dt.day  
+def obtener_plan(banco):
+    """Devuelve el plan (en caché) para la versión actual de las reglas del banco."""
+    return compilar_plan(banco, version_reglas(reglas_bancos.get(banco)))
 
 
-        # ✅ Importe como número (float)
-    df_out['importe'] = pd.to_numeric(df.iloc[:, columnas['importe']],errors="coerce").fillna(0)
-   
+# 5. Función de transformación: ejecuta el plan con el motor disponible (polars o pandas)
 
-        # ✅ Columnas opcionales
-    opcionales = {
-        'nit': lambda s: 
-        s.astype(str)                           # aseguramos string
-        .str.upper()                            # estandarizamos mayúsculas
-        .str.replace(r"[A-Z]", "", regex=True)  # quitamos cualquier letra
-        .str.strip()                            # quitamos espacios en blanco    
-        .str.lstrip('0')                        # quitamos ceros a la izquierda 
-        .apply(limpiar_nit),                    # aplicamos la regla de los 10 dígitos
-        
-        'it': lambda s: s.astype(str),
-        'nid': lambda s: s.astype(str).str.lstrip('0'),
-        'referencia': lambda s: s.astype(str).str.lstrip('0').str.upper()
-    }
+def transformar_extracto(df, banco, archivo=None, motor=None):
+    motor = elegir_motor(motor)
+    plan = obtener_plan(banco)
+    validar_plan(plan, df.shape[1])
 
-    for col, func in opcionales.items():
-        if col in columnas:
-            df_out[col] = func(df.iloc[:, columnas[col]])
-        else:
-            df_out[col] = ""
-
-
-        # ✅ Columnas vacías obligatorias para mantener estructura
-    df_out['i'] = ""
-    df_out['descripcion'] = ""
-    df_out['provisional'] = ""
-
-
-        # ✅ Otros mapeos: Caso especial Davivienda-> Columna 'cuenta' se alimenta del nombre de archivo
-    if banco == "Davivienda":
-        if archivo is not None:
-            nombre_archivo = archivo.name # Obtener el nombre del archivo cargado            
-                    
-                # limpiar el nombre para quitar caracteres raros y extraer el nombre sin extensión
-            numero_cuenta =  re.sub(r'[^A-Za-z0-9_\-]', '',Path(nombre_archivo).stem) 
-            df_out['cuenta'] = numero_cuenta
-        else:
-                # Si por alguna razón no tiene nombre_archivo, deja vacío
-                df_out['cuenta'] = ""
-
-                # Columna 'importe': según referencia (CREDITO -> positivo) (DEBITO -> negativo)
-        referencia_davivienda = df_out['referencia'].fillna("").astype(str).str.upper()
-        df_out.loc[referencia_davivienda.str.contains("DEBITO"), 'importe'] *= -1
-              
-                # mapear id por cuenta (si la cuenta está en el diccionario)
-        df_out['id'] = df_out['cuenta'].map(cuentas_bancos).fillna('Desconocido')        
-                
-    else:
-                # Otros bancos: cuenta viene de columna indicada en reglas
-                # Protegemos el acceso por si falta la clave 'cuenta' en reglas
-                
-        if 'cuenta' in columnas:        
-                df_out['cuenta'] = df.iloc[:, columnas['cuenta']].astype(str)
-        else:
-                df_out['cuenta'] = ""
-    df_out['id'] = df_out['cuenta'].astype(str).map(cuentas_bancos).fillna('Desconocido')  
-
-
-    # ✅ Estructura final
-    df_final = df_out[['id', 'cuenta', 'fecha_ope', 'fecha', 'día', 'numero', 'tipo_transaccion', 'i', 'descripcion', 'it', 'provisional', 'importe','nit','nid', 'referencia']]
-    return df_final
+    if motor == "polars":
+        return ejecutar_plan_polars(df, plan, archivo=archivo)
+    return ejecutar_plan_pandas(df, plan, archivo=archivo)
 
 # -------------------------- Interfaz Streamlit --------------------------
 
-st.subheader("🏦 Bancos de Colombia")
+def seccion_co(procesar=True):
+    """
+    Sección de Colombia. Los widgets se dibujan siempre, para que el banco y los archivos
+    se conserven al cambiar de pestaña; los archivos solo se procesan si procesar=True.
+    """
 
-# Seleccionar banco
-banco_seleccionado = st.selectbox(
-    "Selecciona el banco",
-    options=list(reglas_bancos.keys())
-)
-# Subir archivo
-archivos = st.file_uploader(
-    "📂 Carga tus extractos",
-    type=["txt","csv", "xlsx"],
-    accept_multiple_files=True,
-    key="uploader_co")
+    # Seleccionar banco
+    banco_seleccionado = st.selectbox(
+        "Selecciona el banco",
+        options=list(reglas_bancos.keys()),
+        key="banco_co"
+    )
+    # Subir archivo
+    archivos = st.file_uploader(
+        "📂 Carga tus extractos",
+        type=["txt","csv", "xlsx"],
+        accept_multiple_files=True,
+        key="uploader_co")
 
+    if not procesar:
+        return
 
-# Lista para guardar los resultados de cada archivo transformado
+    # Lista para guardar los resultados de cada archivo transformado
 
-dfs_transformados = []
-archivos_cargados = []
+    dfs_transformados = []
+    archivos_cargados = []
 
-if archivos is not None: # Verifica si hay archivos cargados
-    for archivo in archivos:
-        try:
+    if archivos is not None: # Verifica si hay archivos cargados
+        for archivo in archivos:
+            try:
+
+                # Detectar tipo de archivo por extensión
+                if Path(archivo.name).suffix.lower() not in formatos_lectura:
+                    st.warning(f"Formato no compatible: {archivo.name}")
+                    continue    
 
-            nombre = archivo.name.lower()
-
-            # Detectar tipo de archivo por extensión
-            if nombre.endswith(".txt"):
-                df = pd.read_csv(archivo, sep=';', decimal=",", encoding='latin1', header=None)
-            elif nombre.endswith(".csv"):
-                df = pd.read_csv(archivo, sep=",", decimal=".", encoding="latin1", header=None)
-            elif nombre.endswith(".xlsx"):
-                    if banco_seleccionado == "Davivienda":
-                        df = pd.read_excel(archivo, header=None, skiprows=3)  # ⬅️ Omitir 3 primeras filas
-                    else:
-                        df = pd.read_excel(archivo, header=None)
-            else:
-                st.warning(f"Formato no compatible: {archivo.name}")
-                continue    
+                # Leer solo las columnas del plan (valida el número de columnas antes de la lectura completa)
+                df = leer_extracto(archivo, obtener_plan(banco_seleccionado))
 
                   
-            # Transformar archivo
-            df_transformado = transformar_extracto(df, banco=banco_seleccionado, archivo=archivo)
-            dfs_transformados.append(df_transformado)
-            archivos_cargados.append(f"✅ {archivo.name}")
+                # Transformar archivo
+                df_transformado = transformar_extracto(df, banco=banco_seleccionado, archivo=archivo)
+                dfs_transformados.append(df_transformado)
+                archivos_cargados.append(f"✅ {archivo.name}")
 
-        except Exception as e: 
-            archivos_cargados.append(f"❌ {archivo.name} (Error: {e})")     
+            except Exception as e: 
+                archivos_cargados.append(f"❌ {archivo.name} (Error: {e})")     
     
-    # Mostrar resumen en un expander
-    with st.expander("Ver archivos cargados y estado"):
-        for estado in archivos_cargados:
-            st.write(estado)
+        # Mostrar resumen en un expander
+        with st.expander("Ver archivos cargados y estado"):
+            for estado in archivos_cargados:
+                st.write(estado)
 
-    if dfs_transformados:
-        df_transformado = pd.concat(dfs_transformados, ignore_index=True)
+        if dfs_transformados:
+            df_transformado = pd.concat(dfs_transformados, ignore_index=True)
 
-        st.success("✅ Archivos procesados y consolidados correctamente") 
+            st.success("✅ Archivos procesados y consolidados correctamente") 
 
-        # Ordenar por id de forma ascendente
-        df_transformado = df_transformado.sort_values(by="id", ascending=True).reset_index(drop=True)
+            # Ordenar por id de forma ascendente
+            df_transformado = df_transformado.sort_values(by="id", ascending=True).reset_index(drop=True)
 
-        # Mostrar vista previa del consolidado
-        st.subheader(f"Vista previa:")
-        st.dataframe(df_transformado.head(5))   
+            # Mostrar vista previa del consolidado
+            st.subheader(f"Vista previa:")
+            st.dataframe(df_transformado.head(5))   
             
-        # Descargar archivo en Excel
-        buffer = BytesIO()
-        df_transformado.to_excel(buffer, index=False, engine='openpyxl')
-        buffer.seek(0)
-
-        # Aplicar formato con openpyxl
-        wb = load_workbook(buffer)
-        ws = wb.active        
-
-            
-        if "importe" in df_transformado.columns:
-            # Ubicar la columna "importe" (posición 12 en df_final)
-            col_importe = df_transformado.columns.get_loc('importe') + 1
-            for row in ws.iter_rows(min_row=2, min_col=col_importe, max_col=col_importe):
-                for cell in row:
-                    cell.number_format = '#,##0.00;[Red]-#,##0.00' # miles con "." y decimales con "," y negativos en rojo        
-
-            # Guardar en nuevo buffer
-            buffer_final = BytesIO()
-            wb.save(buffer_final)
-            buffer_final.seek(0)
-
+            # Descargar archivo en Excel (se genera al hacer clic)
             st.download_button(
                 label="📥 Descargar extractos consolidados",
-                data=buffer_final,
+                data=lambda: exportar_excel(df_transformado),
                 file_name=f"{banco_seleccionado} - extractos_transformados.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                on_click="ignore"
+            )
 
 
+# -----------------------------------------------------------------------
+#                                Interfaz 
+#  ----------------------------------------------------------------------
+
+@st.cache_resource(show_spinner=False)
+def tiempos_proceso():
+    """
+    Se crea una vez por proceso del servidor y lo comparten todas las sesiones.
+    Cada sesión ejecuta el script en su propio hilo, por eso el contador va con candado.
+    """
+    return {"ejecuciones": 0, "candado": threading.Lock()}
+
+st.title("Transformador de Extractos")
+tiempo_primer_elemento = time.perf_counter() - inicio_script
+
+# Numerar la ejecución dentro del proceso: la primera es la que encuentra las cachés vacías
+tiempos = tiempos_proceso()
+with tiempos["candado"]:
+    tiempos["ejecuciones"] += 1
+    numero_ejecucion = tiempos["ejecuciones"]
+
+# Con on_change="rerun" las pestañas saben cuál está abierta y solo se procesan los archivos de esa sección.
+# Los widgets de la pestaña cerrada se dibujan igual: si no, Streamlit borra su estado (banco y archivos).
+tab_mx, tab_co = st.tabs(["🏦 Bancos de México", "🏦 Bancos de Colombia"], on_change="rerun", key="pais")
+
+with tab_mx:
+    seccion_mx(procesar=tab_mx.open)
+
+with tab_co:
+    seccion_co(procesar=tab_co.open)
+
+# ⏱️ Tiempos del script, medidos desde después de los imports (no incluyen el arranque del servidor)
+tipo_ejecucion = "Primera ejecución del proceso" if numero_ejecucion == 1 else f"Ejecución n.º {numero_ejecucion} del proceso"
+st.caption(
+    f"⏱️ {tipo_ejecucion}: título en {tiempo_primer_elemento:.2f} s · "
+    f"script completo en {time.perf_counter() - inicio_script:.2f} s "
+    f"(desde después de los imports; sin contar el arranque del servidor)"
+)
@@ -0,0 +1,81 @@
+"""Lectura de extractos según el plan: validación del número de columnas."""
+import re
+import sys
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("streamlit")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("openpyxl")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import app  # noqa: E402
+
+
+class Archivo(BytesIO):
+    """Imita el archivo subido de Streamlit (bytes + nombre)."""
+    def __init__(self, datos, name):
+        super().__init__(datos)
+        self.name = name
+
+
+def excel(df):
+    buffer = BytesIO()
+    df.to_excel(buffer, header=False, index=False)
+    return buffer.getvalue()
+
+
+def test_xlsx_con_ultima_columna_vacia_al_inicio():
+    # Banco de Bogotá: 'referencia' (columna 21) viene vacía en las primeras filas
+    df = pd.DataFrame([[f"v{c}" for c in range(22)] for _ in range(10)])
+    df.iloc[:6, 21] = None
+
+    leido = app.leer_extracto(Archivo(excel(df), "extracto.xlsx"), app.obtener_plan("Banco de Bogotá"))
+
+    assert leido.shape == (10, 22)
+    assert leido.iloc[:6, 21].isna().all()
+    assert (leido.iloc[6:, 21] == "v21").all()
+
+
+def test_xlsx_con_dimension_equivocada():
+    # Algunos programas escriben <dimension ref="A1"/> aunque la hoja tenga 22 columnas
+    df = pd.DataFrame([[f"v{c}" for c in range(22)] for _ in range(5)])
+    entrada, salida = zipfile.ZipFile(BytesIO(excel(df))), BytesIO()
+    with zipfile.ZipFile(salida, "w") as copia:
+        for nombre in entrada.namelist():
+            contenido = entrada.read(nombre)
+            if nombre == "xl/worksheets/sheet1.xml":
+                contenido = re.sub(rb'<dimension ref="[^"]*"\s*/>', b'<dimension ref="A1"/>', contenido)
+            copia.writestr(nombre, contenido)
+
+    leido = app.leer_extracto(Archivo(salida.getvalue(), "extracto.xlsx"), app.obtener_plan("Banco de Bogotá"))
+
+    assert leido.shape == (5, 22)
+    assert (leido.iloc[:, 21] == "v21").all()
+
+@pytest.mark.parametrize("nombre, datos", [
+    ("extracto.txt", b"1;2;3\n4;5;6\n"),
+    ("extracto.xlsx", excel(pd.DataFrame([[1, 2, 3]]))),
+])
+def test_archivo_con_menos_columnas_que_las_reglas(nombre, datos):
+    with pytest.raises(ValueError, match="usan hasta la columna 21"):
+        app.leer_extracto(Archivo(datos, nombre), app.obtener_plan("Banco de Bogotá"))
+
+
+def test_tipos_de_dato_como_la_lectura_completa():
+    # Cuenta con cero a la izquierda y código de transacción con celdas vacías (Banco de Bogotá)
+    filas = [[""] * 22 for _ in range(3)]
+    for fila, (cuenta, numero) in enumerate([("0291252245", "0304"), ("223589391", ""), ("0291252245", "569")]):
+        filas[fila][1], filas[fila][6], filas[fila][10] = cuenta, numero, "1,5"
+    datos = "\n".join(";".join(fila) for fila in filas).encode("latin1")
+    plan = app.obtener_plan("Banco de Bogotá")
+
+    resultado = app.transformar_extracto(app.leer_extracto(Archivo(datos, "extracto.txt"), plan), "Banco de Bogotá")
+
+    assert resultado["cuenta"].tolist() == ["291252245", "223589391", "291252245"]
+    assert resultado["id"].tolist() == [1, 2, 1]
+    assert resultado["numero"].tolist() == ["304", "nan", "569"]
+    assert resultado["importe"].tolist() == [1.5, 1.5, 1.5]
@@ -0,0 +1,121 @@
+"""Paridad entre motores: pandas y polars deben dar exactamente el mismo resultado."""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("streamlit")
+pd = pytest.importorskip("pandas")
+np = pytest.importorskip("numpy")
+pytest.importorskip("polars")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import app  # noqa: E402
+
+
+# Valores que se reparten por todas las columnas: cubren los casos en que los motores podrían diferir
+VALORES = [
+    np.nan,                                  # celdas vacías
+    "1/8/2025",                              # fecha sin ceros a la izquierda
+    "01.08.25",                              # dd.mm.yy
+    "01/08/2025  12:27:45 p. m.",            # fecha con hora
+    "01/08/25",                              # año de dos dígitos: pandas no lo lee con %Y
+    "1/8/25",
+    "01.08.125",                             # año de tres dígitos
+    "2025131",                               # sin separador y con campos de un dígito
+    " 2025-08-01 ",
+    "20250801",
+    "15-09-2024",
+    "basura",
+    "0304",                                  # código con ceros a la izquierda
+    "00569",
+    "GT09",
+    "0008001234567",                         # NIT con ceros a la izquierda
+    "9009876543X",
+    "NIT 8305551234",
+    "DEBITO 0123",                           # referencia Davivienda
+    "credito",
+    "12",                                    # cuenta de menos de 4 caracteres (Banorte)
+    "291252245",                             # cuenta con id
+    "040-000016-02",
+    "0abc",                                  # cuenta sin id -> 'Desconocido'
+    "",
+    "  texto con espacios ",
+    "$1,234.50",
+    "-5",
+    " 5 ",                                   # importes con espacios: pd.to_numeric los lee
+    " -3",
+    "1.5",
+    "ñandú",
+    304,                                     # tipos mezclados, como al leer Excel sin dtype
+    8001234567,
+    pd.Timestamp("2025-08-01"),
+]
+
+BANCOS = (
+    [(app.transformar_extracto_mx, banco, app.reglas_bancos_mx) for banco in app.reglas_bancos_mx]
+    + [(app.transformar_extracto, banco, app.reglas_bancos) for banco in app.reglas_bancos]
+)
+
+
+def columnas_importe(reglas):
+    columnas = reglas["columnas"]
+    return [columnas[nombre] for nombre in ("importe", "cargo", "abono") if nombre in columnas]
+
+
+def extracto(reglas, importes_numericos):
+    """Extracto de prueba con todas las columnas que usan las reglas del banco."""
+    columnas = reglas["columnas"]
+    ancho = max(max(v) if isinstance(v, list) else v for v in columnas.values()) + 1
+    filas = len(VALORES) * 3
+    df = pd.DataFrame({
+        c: pd.Series([VALORES[(fila + 7 * c) % len(VALORES)] for fila in range(filas)], dtype=object)
+        for c in range(ancho)
+    })
+    if importes_numericos:
+        for c in columnas_importe(reglas):
+            df[c] = [[1.5, 2.0, -3.25, np.nan, 100.0][fila % 5] for fila in range(filas)]
+    return df
+
+
+@pytest.mark.parametrize("transformar, banco, reglas", BANCOS, ids=[b for _, b, _ in BANCOS])
+@pytest.mark.parametrize("importes_numericos", [False, True], ids=["importes_texto", "importes_numericos"])
+@pytest.mark.parametrize("archivo", [None, SimpleNamespace(name="291252245.xlsx")], ids=["sin_archivo", "con_archivo"])
+def test_motores_dan_el_mismo_resultado(transformar, banco, reglas, importes_numericos, archivo):
+    df = extracto(reglas[banco], importes_numericos)
+
+    resultado_pandas = transformar(df, banco, archivo=archivo, motor="pandas")
+    resultado_polars = transformar(df, banco, archivo=archivo, motor="polars")
+
+    pd.testing.assert_frame_equal(resultado_pandas, resultado_polars)
+
+
+def test_importes_todos_enteros_dan_el_mismo_resultado():
+    df = extracto(app.reglas_bancos["Bancolombia"], importes_numericos=False)
+    df[app.reglas_bancos["Bancolombia"]["columnas"]["importe"]] = 3
+
+    pd.testing.assert_frame_equal(
+        app.transformar_extracto(df, "Bancolombia", motor="pandas"),
+        app.transformar_extracto(df, "Bancolombia", motor="polars"),
+    )
+
+
+@pytest.mark.parametrize("motor", ["pandas", "polars"])
+def test_importes_con_espacios_junto_a_texto(motor):
+    df = extracto(app.reglas_bancos["Bancolombia"], importes_numericos=False).head(4)
+    df[app.reglas_bancos["Bancolombia"]["columnas"]["importe"]] = [" 5 ", " -3", "basura", "\t7\n"]
+
+    resultado = app.transformar_extracto(df, "Bancolombia", motor=motor)
+
+    assert resultado["importe"].tolist() == [5.0, -3.0, 0.0, 7.0]
+
+def test_motor_desconocido():
+    with pytest.raises(ValueError, match="Motor desconocido"):
+        app.transformar_extracto(pd.DataFrame(), "Bancolombia", motor="spark")
+
+
+def test_polars_no_instalado(monkeypatch):
+    monkeypatch.setattr(app, "pl", None)
+    with pytest.raises(ValueError, match="no está disponible"):
+        app.transformar_extracto_mx(pd.DataFrame(), "BBVA", motor="polars")